@@ -290,7 +290,8 @@ class MyMasterNew:
             self.retrieve_db_by_gvid(gv_id=gv_id)
             gv_cls: opendnp3.GroupVariation = parsing_gvid_to_gvcls(gv_id)
             # filtered_db_w_ts.update({gv_cls: self.soe_handler.gv_ts_ind_val_dict.get(gv_cls)})
-            filtered_db_w_ts.update({gv_cls: (self.soe_handler.gv_last_poll_dict.get(gv_cls),
+            last_poll = self.soe_handler.monotonic_to_datetime(self.soe_handler.last_poll_monotonic(gv_cls))
+            filtered_db_w_ts.update({gv_cls: (last_poll,
                                               self.soe_handler.gv_index_value_nested_dict.get(gv_cls))})
 
         return filtered_db_w_ts
@@ -326,9 +327,9 @@ class MyMasterNew:
         #     gv_cls)
         ret_val: {opendnp3.GroupVariation: Dict[int, DbPointVal]}
 
-        ts = self.soe_handler.gv_last_poll_dict.get(gv_cls)
+        ts = self.soe_handler.last_poll_monotonic(gv_cls)
         stale_if_longer_than = self.stale_if_longer_than
-        if ts and (datetime.datetime.now() - ts).total_seconds() < stale_if_longer_than:
+        if ts is not None and (time.monotonic() - ts) < stale_if_longer_than:
             # Note: there is caching logic to prevent overuse self.master.ScanAllObjects.
             # The stale checking logic is to prevent extensive caching
             val_body = self.soe_handler.gv_index_value_nested_dict.get(gv_cls)
@@ -348,9 +349,7 @@ class MyMasterNew:
         gv_cls: opendnp3.GroupVariation = parsing_gvid_to_gvcls(gv_id)
 
         # Start from fresh--Set val_storage to None
-        self.soe_handler.gv_index_value_nested_dict[gv_cls] = None
-        self.soe_handler.gv_ts_ind_val_dict[gv_cls] = None
-        self.soe_handler.gv_last_poll_dict[gv_cls] = None
+        self.soe_handler.reset_gv(gv_cls)
         # perform scan
         config = opendnp3.TaskConfig().Default()
         # TODO: "prettify" the following while loop workflow. e.g., helper function + recurrent function
@@ -390,9 +389,7 @@ class MyMasterNew:
                 #                                                 self.soe_handler.gv_ts_ind_val_dict.get(gv_cls))
 
                 # Action: set polling attempt timestamp, set db value associated to gv_cls to None.
-                self.soe_handler.gv_last_poll_dict[gv_cls] = datetime.datetime.now()
-                self.soe_handler.gv_index_value_nested_dict[
-                    gv_cls] = None  # Note: redundant, but explicitly define again.
+                self.soe_handler.mark_polled(gv_cls)
 
         return {gv_cls: gv_db_val}
 
@@ -445,9 +442,9 @@ class MyMasterNew:
         gv_id = opendnp3.GroupVariationID(group, variation)
         gv_cls: opendnp3.GroupVariation = parsing_gvid_to_gvcls(gv_id)
 
-        ts = self.soe_handler.gv_last_poll_dict.get(gv_cls)
+        ts = self.soe_handler.last_poll_monotonic(gv_cls)
         stale_if_longer_than = self.stale_if_longer_than
-        if ts and (datetime.datetime.now() - ts).total_seconds() < stale_if_longer_than:  # Use aggressive caching
+        if ts is not None and (time.monotonic() - ts) < stale_if_longer_than:  # Use aggressive caching
             vals: Dict[int, DbPointVal] = self.soe_handler.gv_index_value_nested_dict.get(gv_cls)
         else:  # Use normal routine
             vals: Dict[int, DbPointVal] = self.get_db_by_group_variation(group, variation).get(gv_cls)
@@ -1,23 +1,29 @@
 from __future__ import annotations
 
+import functools
 import logging
 import sys
+import threading
+import time
+import weakref
 
 import pydnp3.asiopal
 from pydnp3 import opendnp3, openpal, asiopal, asiodnp3
-import time
 
-from typing import Union, Type, Dict
+from typing import Union, Type, Dict, List, Tuple, Optional
 
 from .station_utils import master_to_outstation_command_parser
 from .station_utils import OutstationCmdType, MasterCmdType
 # from .outstation_utils import MeasurementType
 from .station_utils import DBHandler
+from .station_utils import AppChannelListener
 
 LOG_LEVELS = opendnp3.levels.NORMAL | opendnp3.levels.ALL_COMMS
 LOCAL_IP = "0.0.0.0"
 PORT = 20000
 # PORT = 20001
+BATCH_MAX = 50  # max number of pending updates before flushing to the outstation
+BATCH_MS = 50  # max time (in milliseconds) an update stays pending before flushing
 
 stdout_stream = logging.StreamHandler(sys.stdout)
 stdout_stream.setFormatter(logging.Formatter('%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s'))
@@ -28,6 +34,29 @@ _log.setLevel(logging.DEBUG)
 # _log.setLevel(logging.ERROR)
 _log.setLevel(logging.INFO)
 
+# database point config templates, used by MyOutStationNew.configure_database
+# (index, clazz, svariation, evariation)
+_ANALOG_CONFIG = (
+    # note: experiment, Analog input - double-precision, floating-point with flag ref: https://docs.stepfunc.io/dnp3/0.9.0/dotnet/namespacednp3.html#aa326dc3592a41ae60222051044fb084f
+    (0, opendnp3.PointClass.Class2, opendnp3.StaticAnalogVariation.Group30Var5,
+     opendnp3.EventAnalogVariation.Group32Var7),
+    (1, opendnp3.PointClass.Class2, opendnp3.StaticAnalogVariation.Group30Var1,
+     opendnp3.EventAnalogVariation.Group32Var7),
+)
+_BINARY_CONFIG = tuple(
+    (index, opendnp3.PointClass.Class2, opendnp3.StaticBinaryVariation.Group1Var2,
+     opendnp3.EventBinaryVariation.Group2Var2)
+    for index in range(3)
+)
+# Kefei's wild guess for analog output config
+# (index, clazz, svariation)
+_AO_STATUS_CONFIG = (
+    (0, opendnp3.PointClass.Class2, opendnp3.StaticAnalogOutputStatusVariation.Group40Var1),
+)
+_BO_STATUS_CONFIG = (
+    (0, opendnp3.PointClass.Class2, opendnp3.StaticBinaryOutputStatusVariation.Group10Var2),
+)
+
 # alias
 PointValueType = Union[opendnp3.Analog, opendnp3.Binary, opendnp3.AnalogOutputStatus, opendnp3.BinaryOutputStatus]
 
@@ -73,6 +102,10 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
 
                  channel_log_level=opendnp3.levels.NORMAL,
                  outstation_log_level=opendnp3.levels.NORMAL,
+
+                 batch_max: int = BATCH_MAX,
+                 batch_ms: float = BATCH_MS,
+                 coalesce_updates: bool = False,
                  ):
         super().__init__()
 
@@ -109,12 +142,15 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
         # init steps: DNP3Manager(manager) -> TCPClient(channel) -> Master(master)
         # init DNP3Manager(manager)
         _log.debug('Creating a DNP3Manager.')
-        self.manager = asiodnp3.DNP3Manager(concurrency_hint, self.log_handler)  # TODO: play with concurrencyHint
+        # Note: concurrency_hint is the number of asio worker threads of this manager, default to 1.
+        # Each MyOutStationNew owns one manager with one channel (and one outstation), whose work opendnp3 runs
+        # serialized on the channel's strand, so more threads only help several channels sharing one manager.
+        self.manager = asiodnp3.DNP3Manager(concurrency_hint, self.log_handler)
 
         # init TCPClient(channel)
         _log.debug('Creating the DNP3 channel, a TCP server.')
         self.retry_parameters = asiopal.ChannelRetry().Default()
-        self.listener = AppChannelListener()
+        self.listener = AppChannelListener(logger=_log)  # Note: log channel state changes at this module's level
         # self.listener = asiodnp3.PrintingChannelListener().Create()       # (or use this during regression testing)
         level = opendnp3.levels.NORMAL | opendnp3.levels.ALL_COMMS  # seems not working
         self.channel = self.manager.AddTCPServer(id="server",
@@ -126,13 +162,17 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
 
         _log.debug('Adding the outstation to the channel.')
         self.outstation_app_id = outstation_ip + "-" + str(port)
-        # self.command_handler = OutstationCommandHandler()
+        # init outstation applicatioin, # Note: singleton for AddOutstation()
+        MyOutStationNew.set_outstation_application(outstation_application=self)
+        # Note: register to the pool before post_init, so that the command handler can bind to it
+        # Note: register this instance (not the singleton), so that commands reach the matching outstation
+        MyOutStationNew.add_outstation_app(outstation_id=self.outstation_app_id,
+                                           outstation_app=self)
+
         self.command_handler = MyOutstationCommandHandler()
-        # Note: use post init to link outstation application and OutstationCommandHandler instance(object)
+        # Note: use post init to link outstation application and MyOutstationCommandHandler instance(object)
         self.command_handler.post_init(outstation_id=self.outstation_app_id)
         # self.command_handler =  opendnp3.SuccessCommandHandler().Create() # (or use this during regression testing)
-        # init outstation applicatioin, # Note: singleton for AddOutstation()
-        MyOutStationNew.set_outstation_application(outstation_application=self)
 
         # finally, init outstation
         self.outstation = self.channel.AddOutstation(id="outstation-" + self.outstation_app_id,
@@ -140,9 +180,6 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
                                                      application=MyOutStationNew.outstation_application,
                                                      config=self.stack_config)
 
-        MyOutStationNew.add_outstation_app(outstation_id=self.outstation_app_id,
-                                           outstation_app=self.outstation_application)
-
         # Configure log level for channel(tcpclient) and outstation
         # note: one of the following
         #   ALL = -1
@@ -166,6 +203,36 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
         self.db_handler = DBHandler(stack_config=self.stack_config)
         # MyOutStationNew.set_db_handler(self.db_handler)
 
+        # bound methods used on the update path (avoid attribute resolution per update)
+        self._apply = self.outstation.Apply
+        self._db_process = self.db_handler.process
+
+        # batching: coalesce apply_update calls into a single UpdateBuilder transaction
+        # Note: flush when either batch_max updates are pending or batch_ms elapsed since the first pending update
+        self.batch_max: int = batch_max
+        self.batch_ms: float = batch_ms
+        # Note: coalesce_updates=True keeps only the latest pending value per point (measurement type, index).
+        # Off by default, since superseded values would otherwise never be reported as (class 1/2/3) events.
+        self.coalesce_updates: bool = coalesce_updates
+        # Note: one open UpdateBuilder per batch, apply_update stages into it, so that invalid input
+        # (e.g., index out of range, unsupported measurement type) raises in the caller of apply_update
+        self._pending_builder: asiodnp3.UpdateBuilder = asiodnp3.UpdateBuilder()
+        self._pending_count: int = 0
+        # Note: coalesce_updates only, the latest value per point, rebuilt into a new UpdateBuilder at flush
+        self._pending_updates: List[Tuple[OutstationCmdType, int]] = []
+        self._pending_positions: Dict[Tuple[str, int], int] = {}  # point -> position in _pending_updates
+        self._pending_lock = threading.Condition()
+        self._flush_deadline: float = 0  # time.monotonic() value, when the first pending update is due
+        self._flusher_stopped: bool = False
+        # Note: one long-lived flusher thread per outstation, stopped in shutdown()
+        # Note: the thread only holds a weak reference, so that it does not keep this instance alive (see __del__)
+        outstation_ref = weakref.ref(self, functools.partial(MyOutStationNew._wake_flusher, self._pending_lock))
+        self._flusher = threading.Thread(target=MyOutStationNew._flush_loop,
+                                         args=(outstation_ref, self._pending_lock),
+                                         name="flusher-" + self.outstation_app_id,
+                                         daemon=True)
+        self._flusher.start()
+
         # configuration info
         self._comm_conifg = {
             # "masterstation_ip_str": masterstation_ip_str,
@@ -263,38 +330,20 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
             Configure two Binary points (group/variation 1.2) at indexes 1 and 2.
         """
         # TODO: figure out the right way to configure
-
-        # AnalogInput
-        db_config.analog[0].clazz = opendnp3.PointClass.Class2
-        # db_config.analog[0].svariation = opendnp3.StaticAnalogVariation.Group30Var1
-        db_config.analog[
-            0].svariation = opendnp3.StaticAnalogVariation.Group30Var5  # note: experiment, Analog input - double-precision, floating-point with flag ref: https://docs.stepfunc.io/dnp3/0.9.0/dotnet/namespacednp3.html#aa326dc3592a41ae60222051044fb084f
-        db_config.analog[0].evariation = opendnp3.EventAnalogVariation.Group32Var7
-        db_config.analog[1].clazz = opendnp3.PointClass.Class2
-        db_config.analog[1].svariation = opendnp3.StaticAnalogVariation.Group30Var1
-        db_config.analog[1].evariation = opendnp3.EventAnalogVariation.Group32Var7
-        # db_config.analog[2].clazz = opendnp3.PointClass.Class2
-        # db_config.analog[2].svariation = opendnp3.StaticAnalogVariation.Group30Var1
-        # db_config.analog[2].evariation = opendnp3.EventAnalogVariation.Group32Var7
-
-        # BinaryInput
-        db_config.binary[0].clazz = opendnp3.PointClass.Class2
-        db_config.binary[0].svariation = opendnp3.StaticBinaryVariation.Group1Var2
-        db_config.binary[0].evariation = opendnp3.EventBinaryVariation.Group2Var2
-        db_config.binary[1].clazz = opendnp3.PointClass.Class2
-        db_config.binary[1].svariation = opendnp3.StaticBinaryVariation.Group1Var2
-        db_config.binary[1].evariation = opendnp3.EventBinaryVariation.Group2Var2
-        db_config.binary[2].clazz = opendnp3.PointClass.Class2
-        db_config.binary[2].svariation = opendnp3.StaticBinaryVariation.Group1Var2
-        db_config.binary[2].evariation = opendnp3.EventBinaryVariation.Group2Var2
-
-        # Kefei's wild guess for analog output config
-        db_config.aoStatus[0].clazz = opendnp3.PointClass.Class2
-        db_config.aoStatus[0].svariation = opendnp3.StaticAnalogOutputStatusVariation.Group40Var1
-        # db_config.aoStatus[0].evariation = opendnp3.StaticAnalogOutputStatusVariation.Group40Var1
-        db_config.boStatus[0].clazz = opendnp3.PointClass.Class2
-        db_config.boStatus[0].svariation = opendnp3.StaticBinaryOutputStatusVariation.Group10Var2
-        # db_config.boStatus[0].evariation = opendnp3.StaticBinaryOutputStatusVariation.Group10Var2
+        for index, clazz, svariation, evariation in _ANALOG_CONFIG:
+            db_config.analog[index].clazz = clazz
+            db_config.analog[index].svariation = svariation
+            db_config.analog[index].evariation = evariation
+        for index, clazz, svariation, evariation in _BINARY_CONFIG:
+            db_config.binary[index].clazz = clazz
+            db_config.binary[index].svariation = svariation
+            db_config.binary[index].evariation = evariation
+        for index, clazz, svariation in _AO_STATUS_CONFIG:
+            db_config.aoStatus[index].clazz = clazz
+            db_config.aoStatus[index].svariation = svariation
+        for index, clazz, svariation in _BO_STATUS_CONFIG:
+            db_config.boStatus[index].clazz = clazz
+            db_config.boStatus[index].svariation = svariation
 
     def start(self):
         _log.debug('Enabling the outstation.')
@@ -312,7 +361,15 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
         Note:
             Note: Don't use `self.manager.Shutdown()`, otherwise
             Process finished with exit code 134 (interrupted by signal 6: SIGABRT)
+
+            Note: further apply_update calls (e.g., a late Operate from the master) are rejected after shutdown.
+
+            Note: call shutdown() explicitly, outstation_application_pool (and the outstation_application singleton)
+            keep a reference to the instance, so __del__ does not run as long as it is registered.
         """
+        self._stop_flusher()  # Note: also rejects further updates
+        self.flush_updates()  # Note: send out pending updates before shutting down
+        # Note: no channel state (e.g., SHUTDOWN) to wait on here, Outstation/Channel.Shutdown() are synchronous
         time.sleep(2)  # Note: hard-coded sleep to avoid hanging process
         # _outstation = self.get_outstation()
         _outstation = self.outstation
@@ -330,11 +387,12 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
                         or AnalogOutputInt16.
         :param index: (integer) DNP3 index of the payload's data definition.
         :param op_type: An OperateType, or None if command_type == 'Select'.
+        :return: (bool) False if the update was rejected, i.e., the outstation is shut down
         """
         # TODO: add control logic in scenarios 'Select' or 'Operate' (to allow more sophisticated control behavior)
 
         # print("command __getattribute__ ", command.__getattribute__)
-        _log.debug('Processing received point value for index {}: {}'.format(index, command))
+        _log.debug('Processing received point value for index %s: %s', index, command)
 
         # parse master operation command to outstation update command
         # Note: print("command rawCode ", command.rawCode) for BinaryOutput/ControlRelayOutputBlock
@@ -342,34 +400,118 @@ class MyOutStationNew(opendnp3.IOutstationApplication):
         outstation_cmd = master_to_outstation_command_parser(command)
         # then reuse apply_update
         # cls.apply_update(outstation_cmd, index)
-        self.apply_update(outstation_cmd, index)
+        recorded = self.apply_update(outstation_cmd, index)
+        # Note: send the command echo right away (not batched), so the master can read it back immediately
+        self.flush_updates()
+        return recorded
 
     # @classmethod
     def apply_update(self,
                      measurement: OutstationCmdType,
-                     index):
+                     index) -> bool:
         """
             Record an opendnp3 data value (Analog, Binary, etc.) in the outstation's database.
             Note: measurement based on asiodnp3.UpdateBuilder.Update(**args)
 
             The data value gets sent to the Master as a side effect.
+            Note: updates are batched, i.e., sent out with flush_updates (batch_max updates pending or batch_ms elapsed)
 
         :param measurement: An instance of Analog, Binary, or another opendnp3 data value.
         :param index: (integer) Index of the data definition in the opendnp3 database.
+        :return: (bool) True if recorded, False if rejected, i.e., the outstation is shut down
+        """
+        # Note: guard the debug log to skip the attribute reads (across pybind11) when debug is disabled
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug('Recording %s measurement, index=%s, value=%s, flag=%s, time=%s',
+                       type(measurement), index, measurement.value, measurement.flags.value,
+                       measurement.time.value)
+        with self._pending_lock:
+            if self._flusher_stopped:
+                _log.warning('Outstation %s is shut down, ignoring update: index=%s', self.outstation_app_id, index)
+                return False
+            self._pending_builder.Update(measurement, index)  # Note: raises on invalid input, nothing recorded
+            # Note: the auxiliary database is updated right away, the outstation update is batched
+            self._db_process(measurement, index)
+            if self.coalesce_updates:
+                point = (type(measurement).__name__, index)
+                position = self._pending_positions.get(point)
+                if position is not None:
+                    # Note: replace the superseded value in place (no new event), keep its original order
+                    self._pending_updates[position] = (measurement, index)
+                    return True
+                self._pending_positions[point] = len(self._pending_updates)
+                self._pending_updates.append((measurement, index))
+            self._pending_count += 1
+            if self._pending_count >= self.batch_max:
+                self._flush_pending_updates()
+            elif self._pending_count == 1:
+                # Note: first pending update, wake up the flusher to wait for the deadline
+                self._flush_deadline = time.monotonic() + self.batch_ms / 1000
+                self._pending_lock.notify()
+        return True
+
+    def flush_updates(self):
+        """
+            Send all pending updates (staged by apply_update) to the outstation in a single UpdateBuilder transaction.
+            Note: invoked automatically when batch_max or batch_ms is reached, call it explicitly to send immediately.
         """
-        _log.debug('Recording {} measurement, index={}, '
-                   'value={}, flag={}, time={}'
-                   .format(type(measurement), index, measurement.value, measurement.flags.value,
-                           measurement.time.value))
-        # builder = asiodnp3.UpdateBuilder()
-        # builder.Update(measurement, index)
-        # update = builder.Build()
-        update = asiodnp3.UpdateBuilder().Update(measurement, index).Build()
-        # cls.get_outstation().Apply(update)
-        self.outstation.Apply(update)
-
-        # cls.db_handler.process(measurement, index)
-        self.db_handler.process(measurement, index)
+        with self._pending_lock:
+            self._flush_pending_updates()
+
+    @staticmethod
+    def _flush_loop(outstation_ref: weakref.ReferenceType, pending_lock: threading.Condition):
+        """flusher thread: flush pending updates once batch_ms elapsed since the first pending update
+        Note: exits on shutdown, or once the outstation is garbage collected"""
+        with pending_lock:
+            while True:
+                outstation: Optional[MyOutStationNew] = outstation_ref()
+                if outstation is None or outstation._flusher_stopped:
+                    return
+                timeout = None  # Note: nothing pending, wait for apply_update (or shutdown) to notify
+                if outstation._pending_count:
+                    timeout = outstation._flush_deadline - time.monotonic()
+                    if timeout <= 0:
+                        try:
+                            outstation._flush_pending_updates()
+                        except Exception as e:
+                            # Note: keep the flusher alive, the failed batch is not retried
+                            _log.error(e)
+                        continue
+                del outstation  # Note: do not keep the outstation alive while waiting
+                pending_lock.wait(timeout=timeout)
+
+    @staticmethod
+    def _wake_flusher(pending_lock: threading.Condition, outstation_ref: weakref.ReferenceType = None):
+        """weakref callback: wake up the flusher thread to exit once the outstation is garbage collected"""
+        with pending_lock:
+            pending_lock.notify()
+
+    def _stop_flusher(self):
+        """stop the flusher thread and reject further updates (pending updates are kept, see flush_updates)"""
+        with self._pending_lock:
+            self._flusher_stopped = True
+            self._pending_lock.notify()
+        if self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=2)
+
+    def _flush_pending_updates(self):
+        """Note: caller must hold self._pending_lock"""
+        if not self._pending_count:
+            return
+        builder, pending_updates = self._pending_builder, self._pending_updates
+        # Note: start the next batch before Build/Apply, so that a failed batch is not applied again
+        self._pending_builder = asiodnp3.UpdateBuilder()
+        self._pending_count = 0
+        self._pending_updates = []
+        self._pending_positions.clear()
+
+        if self.coalesce_updates:
+            # Note: the batch builder also staged the superseded values, rebuild from the latest ones
+            builder = asiodnp3.UpdateBuilder()
+            for measurement, index in pending_updates:
+                builder.Update(measurement, index)
+        update = builder.Build()
+        self._apply(update)
 
     def __del__(self):
         try:
@@ -390,19 +532,23 @@ class MyOutstationCommandHandler(opendnp3.ICommandHandler):
 
     # outstation_application = MyOutStationNew
     outstation_id = ""
+    outstation_app = None
 
     # def __init__(self, outstation_id="some-id"):
     #     self.outstation_id = outstation_id
 
     def post_init(self, outstation_id, **kwargs):
-        """helper function to pass values, e.g., outstation_id"""
+        """helper function to pass values, e.g., outstation_id
+        Note: bind the outstation application once here (outstation_application_pool stays the registry),
+        to avoid the pool lookup on every Select/Operate."""
         self.outstation_id = outstation_id
+        self.outstation_app = MyOutStationNew.get_outstation_app(outstation_id)
 
     def Start(self):
-        _log.debug('In OutstationCommandHandler.Start')
+        _log.debug('In MyOutstationCommandHandler.Start')
 
     def End(self):
-        _log.debug('In OutstationCommandHandler.End')
+        _log.debug('In MyOutstationCommandHandler.End')
 
     def Select(self, command, index):
         """
@@ -414,11 +560,11 @@ class MyOutstationCommandHandler(opendnp3.ICommandHandler):
         :param index: int
         :return: CommandStatus
         """
-        outstation_application_pool = MyOutStationNew.outstation_application_pool
-        outstation_app = outstation_application_pool.get(self.outstation_id)
+        outstation_app = self.outstation_app
 
         try:
-            outstation_app.process_point_value('Select', command, index, None)
+            if not outstation_app.process_point_value('Select', command, index, None):
+                return opendnp3.CommandStatus.HARDWARE_ERROR  # Note: rejected, the outstation is shut down
             return opendnp3.CommandStatus.SUCCESS
         except Exception as e:
             _log.error(e)
@@ -437,24 +583,13 @@ class MyOutstationCommandHandler(opendnp3.ICommandHandler):
         :return: CommandStatus
         """
 
-        outstation_application_pool = MyOutStationNew.outstation_application_pool
-        outstation_app = outstation_application_pool.get(self.outstation_id)
+        outstation_app = self.outstation_app
         try:
             # self.outstation_application.process_point_value('Operate', command, index, op_type)
-            outstation_app.process_point_value('Operate', command, index, op_type)
+            if not outstation_app.process_point_value('Operate', command, index, op_type):
+                return opendnp3.CommandStatus.HARDWARE_ERROR  # Note: rejected, the outstation is shut down
             return opendnp3.CommandStatus.SUCCESS
         except Exception as e:
             _log.error(e)
             raise e
 
-
-class AppChannelListener(asiodnp3.IChannelListener):
-    """
-        Override IChannelListener in this manner to implement application-specific channel behavior.
-    """
-
-    def __init__(self):
-        super(AppChannelListener, self).__init__()
-
-    def OnStateChange(self, state):
-        _log.debug('In AppChannelListener.OnStateChange: state={}'.format(state))
@@ -1,13 +1,15 @@
 import datetime
 import logging
+import re
 import sys
 import time
+import types
 
 from pydnp3 import opendnp3, openpal, asiopal, asiodnp3
 from .visitors import *
 from pydnp3.opendnp3 import GroupVariation, GroupVariationID
 
-from typing import Callable, Union, Dict, Tuple, List, Optional, Type, TypeVar
+from typing import Callable, Union, Dict, Tuple, List, Mapping, Optional, Type, TypeVar
 
 stdout_stream = logging.StreamHandler(sys.stdout)
 stdout_stream.setFormatter(logging.Formatter('%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s'))
@@ -46,6 +48,62 @@ OutstationCmdType = Union[opendnp3.Analog,
 MeasurementType = TypeVar("MeasurementType",
                           bound=opendnp3.Measurement)  # inheritance, e.g., opendnp3.Analog,
 
+# visitor class used by SOEHandler.Process for each collection type
+_VISITOR_FOR_COLLECTION: Dict[type, Type[VisitorClass]] = {
+    opendnp3.ICollectionIndexedBinary: VisitorIndexedBinary,
+    opendnp3.ICollectionIndexedDoubleBitBinary: VisitorIndexedDoubleBitBinary,
+    opendnp3.ICollectionIndexedCounter: VisitorIndexedCounter,
+    opendnp3.ICollectionIndexedFrozenCounter: VisitorIndexedFrozenCounter,
+    opendnp3.ICollectionIndexedAnalog: VisitorIndexedAnalog,
+    opendnp3.ICollectionIndexedBinaryOutputStatus: VisitorIndexedBinaryOutputStatus,
+    opendnp3.ICollectionIndexedAnalogOutputStatus: VisitorIndexedAnalogOutputStatus,
+    opendnp3.ICollectionIndexedTimeAndInterval: VisitorIndexedTimeAndInterval
+}
+
+# integer GroupVariation for Analog and AnalogOutputStatus
+# (hot-fix: VisitorXXAnalog do not distinguish float and integer)
+# i.e., Group30Var1-4, Group32Var1-4 (Analog) and Group40Var1-2, Group42Var1-4 (AnalogOutputStatus)
+_ANALOG_INT_GVS = frozenset(gv_cls for name, gv_cls in GroupVariation.__members__.items()
+                            if re.fullmatch(r"Group(30|32)Var[1-4]", name))
+_AOS_INT_GVS = frozenset(gv_cls for name, gv_cls in GroupVariation.__members__.items()
+                         if re.fullmatch(r"Group40Var[12]|Group42Var[1-4]", name))
+
+
+def _build_gvid_table() -> Dict[Tuple[int, int], GroupVariation]:
+    """map (group, variation) to GroupVariation member class, e.g., (30, 6) -> GroupVariation.Group30Var6"""
+    gvid_table = {}
+    for name, gv_cls in GroupVariation.__members__.items():
+        match = re.fullmatch(r"Group(\d+)Var(\d+)", name)
+        if match:
+            gvid_table[(int(match.group(1)), int(match.group(2)))] = gv_cls
+    return gvid_table
+
+
+# (group, variation) -> GroupVariation, used by parsing_gvid_to_gvcls
+_GVID_TABLE: Dict[Tuple[int, int], GroupVariation] = _build_gvid_table()
+
+# (group, variation) -> MasterCmdType, used by parsing_gv_to_mastercmdtype
+_ANALOG_OUTPUT_CMD_TYPES: Dict[Tuple[int, int], Type[MasterCmdType]] = {
+    (40, 1): opendnp3.AnalogOutputInt32,
+    (40, 2): opendnp3.AnalogOutputInt16,
+    (40, 3): opendnp3.AnalogOutputFloat32,
+    (40, 4): opendnp3.AnalogOutputDouble64,
+}
+_BINARY_OUTPUT_CMD_TYPES: Dict[Tuple[int, int], Type[MasterCmdType]] = {
+    (10, 1): opendnp3.ControlRelayOutputBlock,
+    (10, 2): opendnp3.ControlRelayOutputBlock,
+}
+
+# used by master_to_outstation_command_parser
+_ANALOG_OUTPUT_TYPES = (opendnp3.AnalogOutputDouble64,
+                        opendnp3.AnalogOutputFloat32,
+                        opendnp3.AnalogOutputInt32,
+                        opendnp3.AnalogOutputInt16)
+_RAWCODE_TO_BOOL: Dict[int, bool] = {3: True, 4: False}  # ControlRelayOutputBlock rawCode, 3: On/True, 4:Off/False
+
+# pre-bound pydnp3 enum-to-string helper used in callbacks
+_ChannelStateToString = opendnp3.ChannelStateToString
+
 # TODO: add validating connection logic
 # TODO: add validating configuration logic
 #  (e.g., check if db at outstation side is configured correctly, i.e., OutstationStackConfig)
@@ -69,11 +127,17 @@ class AppChannelListener(asiodnp3.IChannelListener):
         Override IChannelListener in this manner to implement application-specific channel behavior.
     """
 
-    def __init__(self):
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        """
+        :param logger: logger for the channel state changes, default to this module's logger
+            Note: e.g., the outstation passes its own (INFO level) logger
+        """
         super(AppChannelListener, self).__init__()
+        self.logger: logging.Logger = logger if logger is not None else _log
 
     def OnStateChange(self, state):
-        _log.debug('In AppChannelListener.OnStateChange: state={}'.format(opendnp3.ChannelStateToString(state)))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('In AppChannelListener.OnStateChange: state=%s', _ChannelStateToString(state))
 
 
 class SOEHandler(opendnp3.ISOEHandler):
@@ -88,8 +152,14 @@ class SOEHandler(opendnp3.ISOEHandler):
 
         # auxiliary database
         self._gv_index_value_nested_dict: Dict[GroupVariation, Optional[Dict[int, DbPointVal]]] = {}
-        self._gv_ts_ind_val_dict: Dict[GroupVariation, Tuple[datetime.datetime, Optional[Dict[int, DbPointVal]]]] = {}
-        self._gv_last_poll_dict: Dict[GroupVariation, Optional[datetime.datetime]] = {}
+        # Note: timestamps are time.monotonic() values (in seconds), see monotonic_to_datetime for wallclock
+        self._gv_ts_ind_val_dict: Dict[GroupVariation, Optional[Tuple[float, Optional[Dict[int, DbPointVal]]]]] = {}
+        self._gv_last_poll_dict: Dict[GroupVariation, Optional[float]] = {}
+
+        # visitor class cache, keyed by (collection type, GroupVariation)
+        self._visitor_cache: Dict[Tuple[type, GroupVariation], Type[VisitorClass]] = {}
+        # idle visitor instances for reuse, keyed by visitor class
+        self._visitor_pool: Dict[Type[VisitorClass], VisitorClass] = {}
 
         # logging
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -113,54 +183,35 @@ class SOEHandler(opendnp3.ISOEHandler):
         :param values: A collection of values received from the Outstation (various data types are possible).
         """
         # print("=========Process, info.gv, values", info.gv, values)
-        visitor_class_types: dict = {
-            opendnp3.ICollectionIndexedBinary: VisitorIndexedBinary,
-            opendnp3.ICollectionIndexedDoubleBitBinary: VisitorIndexedDoubleBitBinary,
-            opendnp3.ICollectionIndexedCounter: VisitorIndexedCounter,
-            opendnp3.ICollectionIndexedFrozenCounter: VisitorIndexedFrozenCounter,
-            opendnp3.ICollectionIndexedAnalog: VisitorIndexedAnalog,
-            opendnp3.ICollectionIndexedBinaryOutputStatus: VisitorIndexedBinaryOutputStatus,
-            opendnp3.ICollectionIndexedAnalogOutputStatus: VisitorIndexedAnalogOutputStatus,
-            opendnp3.ICollectionIndexedTimeAndInterval: VisitorIndexedTimeAndInterval
-        }
-        visitor_class: Union[Callable, VisitorClass] = visitor_class_types[type(values)]
-        visitor = visitor_class()  # init
-        # hot-fix VisitorXXAnalog do not distinguish float and integer.
-        if visitor_class == VisitorIndexedAnalog:
-            # Parsing to Int
-            if info.gv in [
-                # GroupVariation.Group30Var0,
-                GroupVariation.Group30Var1,
-                GroupVariation.Group30Var2,
-                GroupVariation.Group30Var3,
-                GroupVariation.Group30Var4,
-                # GroupVariation.Group32Var0,
-                GroupVariation.Group32Var1,
-                GroupVariation.Group32Var2,
-                GroupVariation.Group32Var3,
-                GroupVariation.Group32Var4
-            ]:
-                visitor = VisitorIndexedAnalogInt()
-        elif visitor_class == VisitorIndexedAnalogOutputStatus:
-            if info.gv in [
-                # GroupVariation.Group40Var0,
-                GroupVariation.Group40Var1,
-                GroupVariation.Group40Var2,
-                # GroupVariation.Group42Var0,
-                GroupVariation.Group42Var1,
-                GroupVariation.Group42Var2,
-                GroupVariation.Group42Var3,
-                GroupVariation.Group42Var4
-            ]:
-                visitor = VisitorIndexedAnalogOutputStatusInt()
+        # Note: the visitor class only depends on (collection type, gv), resolve it once per pair
+        visitor_key: Tuple[type, GroupVariation] = (type(values), info.gv)
+        visitor_class: Union[Callable, VisitorClass] = self._visitor_cache.get(visitor_key)
+        if visitor_class is None:
+            visitor_class = _VISITOR_FOR_COLLECTION[type(values)]
+            # hot-fix VisitorXXAnalog do not distinguish float and integer.
+            if visitor_class == VisitorIndexedAnalog and info.gv in _ANALOG_INT_GVS:
+                # Parsing to Int
+                visitor_class = VisitorIndexedAnalogInt
+            elif visitor_class == VisitorIndexedAnalogOutputStatus and info.gv in _AOS_INT_GVS:
+                visitor_class = VisitorIndexedAnalogOutputStatusInt
+            self._visitor_cache[visitor_key] = visitor_class
+        # Note: reuse an idle visitor of this class, taken out of the pool while in use (thread-safe)
+        visitor = self._visitor_pool.pop(visitor_class, None)
+        if visitor is None:
+            visitor = visitor_class()  # init
+        else:
+            # Note: OnValue appends, so start from a new list (the previous one may still be referenced)
+            visitor.index_and_value = []
         # Note: mystery method, magic side effect to update visitor.index_and_value
         values.Foreach(visitor)
 
         # visitor.index_and_value: List[Tuple[int, DbPointVal]]
-        for index, value in visitor.index_and_value:
-            log_string = 'SOEHandler.Process {0}\theaderIndex={1}\tdata_type={2}\tindex={3}\tvalue={4}'
-            self.logger.debug(log_string.format(info.gv, info.headerIndex, type(values).__name__, index, value))
-            # print(log_string.format(info.gv, info.headerIndex, type(values).__name__, index, value))
+        # Note: skip the per-point loop entirely when debug is disabled (or nothing received, e.g., empty response)
+        if visitor.index_and_value and self.logger.isEnabledFor(logging.DEBUG):
+            data_type = type(values).__name__
+            for index, value in visitor.index_and_value:
+                self.logger.debug('SOEHandler.Process %s\theaderIndex=%s\tdata_type=%s\tindex=%s\tvalue=%s',
+                                  info.gv, info.headerIndex, data_type, index, value)
 
         info_gv: GroupVariation = info.gv
         visitor_ind_val: List[Tuple[int, DbPointVal]] = visitor.index_and_value
@@ -169,6 +220,7 @@ class SOEHandler(opendnp3.ISOEHandler):
         # _log.info(f"info_gv {info_gv}")
         # _log.info(f"visitor_ind_val {visitor_ind_val}")
         self._post_process(info_gv=info_gv, visitor_ind_val=visitor_ind_val)
+        self._visitor_pool[visitor_class] = visitor
 
     def _post_process(self, info_gv: GroupVariation, visitor_ind_val: List[Tuple[int, DbPointVal]]):
         """
@@ -180,16 +232,20 @@ class SOEHandler(opendnp3.ISOEHandler):
         """
         # Use dict update method to mitigate delay due to asynchronous communication. (i.e., return None)
         # Also, capture unsolicited updated values.
-        if not self._gv_index_value_nested_dict.get(info_gv):
-            self._gv_index_value_nested_dict[info_gv] = (dict(visitor_ind_val))
-        else:
-            self._gv_index_value_nested_dict[info_gv].update(dict(visitor_ind_val))
+        # Note: dict.update accepts the (index, value) pairs directly, no intermediate dict needed
+        # Note: the value can be missing, or reset to None by the master before polling from fresh
+        # Note: an empty response still stores {} (and the polling timestamp), i.e., polled but no points
+        inner = self._gv_index_value_nested_dict.get(info_gv)
+        if inner is None:
+            inner = self._gv_index_value_nested_dict[info_gv] = {}
+        if visitor_ind_val:
+            inner.update(visitor_ind_val)
 
         # Use another layer of storage to handle timestamp related logic
-        self._gv_ts_ind_val_dict[info_gv] = (datetime.datetime.now(),
-                                             self._gv_index_value_nested_dict.get(info_gv))
+        now = time.monotonic()
+        self._gv_ts_ind_val_dict[info_gv] = (now, inner)
         # Use another layer of storage to handle timestamp related logic
-        self._gv_last_poll_dict[info_gv] = datetime.datetime.now()
+        self._gv_last_poll_dict[info_gv] = now
 
     def Start(self):
         self.logger.debug('In SOEHandler.Start====')
@@ -202,12 +258,55 @@ class SOEHandler(opendnp3.ISOEHandler):
         return self._gv_index_value_nested_dict
 
     @property
-    def gv_ts_ind_val_dict(self):
-        return self._gv_ts_ind_val_dict
+    def gv_ts_ind_val_dict(self) -> \
+            Mapping[GroupVariation, Optional[Tuple[datetime.datetime, Optional[Dict[int, DbPointVal]]]]]:
+        """(last polling timestamp, index-value dict) per group-variation, timestamp as wallclock datetime
+        Note: read-only (writes raise TypeError), converted from time.monotonic() on each access,
+        use reset_gv to reset an entry"""
+        origin = self.monotonic_origin()
+        return types.MappingProxyType(
+            {gv: None if ts_val is None else (self.monotonic_to_datetime(ts_val[0], origin), ts_val[1])
+             for gv, ts_val in self._gv_ts_ind_val_dict.items()})
 
     @property
-    def gv_last_poll_dict(self) -> Dict[GroupVariation, Optional[datetime.datetime]]:
-        return self._gv_last_poll_dict
+    def gv_last_poll_dict(self) -> Mapping[GroupVariation, Optional[datetime.datetime]]:
+        """last polling timestamp per group-variation, as wallclock datetime
+        Note: read-only (writes raise TypeError), converted from time.monotonic() on each access,
+        use last_poll_monotonic for staleness checks, reset_gv/mark_polled to update"""
+        origin = self.monotonic_origin()
+        return types.MappingProxyType(
+            {gv: self.monotonic_to_datetime(ts, origin) for gv, ts in self._gv_last_poll_dict.items()})
+
+    def last_poll_monotonic(self, info_gv: GroupVariation) -> Optional[float]:
+        """last polling timestamp of a group-variation, as time.monotonic() value (in seconds)"""
+        return self._gv_last_poll_dict.get(info_gv)
+
+    def reset_gv(self, info_gv: GroupVariation):
+        """set the stored values and timestamps of a group-variation to None, i.e., poll from fresh"""
+        self._gv_index_value_nested_dict[info_gv] = None
+        self._gv_ts_ind_val_dict[info_gv] = None
+        self._gv_last_poll_dict[info_gv] = None
+
+    def mark_polled(self, info_gv: GroupVariation):
+        """set the polling attempt timestamp of a group-variation (with no value), e.g., when retry limit is hit"""
+        self._gv_last_poll_dict[info_gv] = time.monotonic()
+        self._gv_index_value_nested_dict[info_gv] = None
+
+    @staticmethod
+    def monotonic_origin() -> datetime.datetime:
+        """wallclock datetime of time.monotonic() == 0, from one (now, monotonic) reading"""
+        return datetime.datetime.now() - datetime.timedelta(seconds=time.monotonic())
+
+    @staticmethod
+    def monotonic_to_datetime(ts: Optional[float],
+                              origin: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+        """convert a time.monotonic() timestamp (e.g., from last_poll_monotonic) to wallclock datetime
+        Note: pass the same origin (see monotonic_origin) to convert several timestamps consistently"""
+        if ts is None:
+            return None
+        if origin is None:
+            origin = SOEHandler.monotonic_origin()
+        return origin + datetime.timedelta(seconds=ts)
 
     @property
     def db(self) -> dict:
@@ -292,57 +391,38 @@ def parsing_gvid_to_gvcls(gvid: GroupVariationID) -> GroupVariation:
     >>> parsing_gvid_to_gvcls(gvid=GroupVariationID(30, 6))
     GroupVariation.Group30Var6
     """
-    # print("====gvId GroupVariationID", gvid)
-    group: int = gvid.group
-    variation: int = gvid.variation
-    gv_cls: GroupVariation
-
-    gv_cls = GroupVariationID(30, 6)  # default
-    # auto parsing
-    try:
-        gv_cls = getattr(opendnp3.GroupVariation, f"Group{group}Var{variation}")
-        assert gv_cls is not None
-    except ValueError as e:
-        _log.warning(f"Group{group}Var{variation} is not valid opendnp3.GroupVariation")
+    gv_cls: Optional[GroupVariation] = _GVID_TABLE.get((gvid.group, gvid.variation))
+    if gv_cls is None:
+        _log.warning(f"Group{gvid.group}Var{gvid.variation} is not valid opendnp3.GroupVariation")
+        gv_cls = GroupVariation.Group30Var6  # default
 
     return gv_cls
 
 
 def parsing_gv_to_mastercmdtype(group: int, variation: int, val_to_set: DbPointVal) -> MasterCmdType:
-    pass
     """
     hard-coded parsing, e.g., group40, variation:4 -> opendnp3.AnalogOutputDouble64
     """
     master_cmd: MasterCmdType
     # AnalogOutput
-    if group == 40:
-        if not type(val_to_set) in [float, int]:
+    master_cmd_cls = _ANALOG_OUTPUT_CMD_TYPES.get((group, variation))
+    if master_cmd_cls is not None:
+        # Note: bool is a subclass of int, but not a valid analog value
+        if isinstance(val_to_set, bool) or not isinstance(val_to_set, (int, float)):
             raise ValueError(f"val_to_set {val_to_set} of MasterCmdType group {group}, variation {variation} invalid.")
-        if variation == 1:
-            master_cmd = opendnp3.AnalogOutputInt32()
-        elif variation == 2:
-            master_cmd = opendnp3.AnalogOutputInt16()
-        elif variation == 3:
-            master_cmd = opendnp3.AnalogOutputFloat32()
-        elif variation == 4:
-            master_cmd = opendnp3.AnalogOutputDouble64()
-        else:
-            raise ValueError(f"val_to_set {val_to_set} of MasterCmdType group {group} invalid.")
-
+        master_cmd = master_cmd_cls()
         master_cmd.value = val_to_set
+        return master_cmd
     # BinaryOutput
-    elif group == 10 and variation in [1, 2]:
-        master_cmd = opendnp3.ControlRelayOutputBlock()
-        if not type(val_to_set) is bool:
+    master_cmd_cls = _BINARY_OUTPUT_CMD_TYPES.get((group, variation))
+    if master_cmd_cls is not None:
+        if not isinstance(val_to_set, bool):
             raise ValueError(f"val_to_set {val_to_set} of MasterCmdType group {group}, variation {variation} invalid.")
-        if val_to_set is True:
-            master_cmd.rawCode = 3
-        else:
-            master_cmd.rawCode = 4
-    else:
-        raise ValueError(f"val_to_set {val_to_set} of MasterCmdType group {group} invalid.")
+        master_cmd = master_cmd_cls()
+        master_cmd.rawCode = 3 if val_to_set else 4
+        return master_cmd
 
-    return master_cmd
+    raise ValueError(f"val_to_set {val_to_set} of MasterCmdType group {group}, variation {variation} invalid.")
 
 
 # alias
@@ -360,19 +440,12 @@ def master_to_outstation_command_parser(master_cmd: MasterCmdType) -> Outstation
     Used to parse send command to update command, e.g., opendnp3.AnalogOutputDouble64 -> AnalogOutputStatus
     """
     # return None
-    if type(master_cmd) in [opendnp3.AnalogOutputDouble64,
-                            opendnp3.AnalogOutputFloat32,
-                            opendnp3.AnalogOutputInt32,
-                            opendnp3.AnalogOutputInt16]:
+    if isinstance(master_cmd, _ANALOG_OUTPUT_TYPES):
         return opendnp3.AnalogOutputStatus(value=master_cmd.value)
-    elif type(master_cmd) is opendnp3.ControlRelayOutputBlock:
+    elif isinstance(master_cmd, opendnp3.ControlRelayOutputBlock):
         # Note: ControlRelayOutputBlock requires to use hard-coded rawCode to retrieve value at this version.
-        bi_value: bool
-        if master_cmd.rawCode == 3:
-            bi_value = True
-        elif master_cmd.rawCode == 4:
-            bi_value = False
-        else:
+        bi_value: Optional[bool] = _RAWCODE_TO_BOOL.get(master_cmd.rawCode)
+        if bi_value is None:
             raise ValueError(
                 f"master_cmd.rawCode {master_cmd.rawCode} is not a valid rawCode. (3: On/True, 4:Off/False.")
         return opendnp3.BinaryOutputStatus(value=bi_value)
@@ -437,7 +510,10 @@ class MyLogger(openpal.ILogHandler):
         super(MyLogger, self).__init__()
 
     def Log(self, entry):
+        # Note: skip reading the entry (across pybind11) when debug is disabled
+        if not _log.isEnabledFor(logging.DEBUG):
+            return
         filters = entry.filters.GetBitfield()
-        location = entry.location.rsplit('/')[-1] if entry.location else ''
+        location = entry.location.rpartition('/')[2] if entry.location else ''
         message = entry.message
-        _log.debug('Log\tfilters={}\tlocation={}\tentry={}'.format(filters, location, message))
\ No newline at end of file
+        _log.debug('Log\tfilters=%s\tlocation=%s\tentry=%s', filters, location, message)
\ No newline at end of file